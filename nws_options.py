@@ -1,7 +1,15 @@
+import re
+from collections import defaultdict
+from functools import lru_cache
+
 NWS_REGIONS = {"AR": "Alaska Region", "CR": "Central Region", "ER": "Eastern Region",
                "PR": "Pacific Region", "SR": "Southern Region", "WR": "Western Region",
                "HQ/NCEP":"National",}
 
+# Letter that follows the directive number in a regional supplemental's file name
+SUPPLEMENTAL_REGION_CODES = {"a": "Alaska Region", "c": "Central Region", "e": "Eastern Region",
+                             "p": "Pacific Region", "s": "Southern Region", "w": "Western Region"}
+
 NWS_OFFICES = {'ABR - WFO ABERDEEN': 'Central Region',
                'ABRFC - ARKANSAS-RED BASIN (TULSA) RFC': 'Southern Region',
                'AFC - WFO ANCHORAGE': 'Alaska Region',
@@ -165,9 +173,41 @@ NWS_OFFICES = {'ABR - WFO ABERDEEN': 'Central Region',
                'WR-ROC - WESTERN REGION ROC': 'Western Region',
                'OTHER - OTHER - HEADQUARTERS/NATIONAL': 'National'}
 
+# Region names in dropdown order, and each region's selectbox position (after the blank option)
+REGION_VALUES = list(NWS_REGIONS.values())
+REGION_TO_IDX = {region: i + 1 for i, region in enumerate(REGION_VALUES)}
+REGION_OPTIONS = [""] + REGION_VALUES
 
+# Offices grouped by region, and each office's position within its region's list
+OFFICES_BY_REGION = defaultdict(list)
+for office, region in NWS_OFFICES.items():
+    OFFICES_BY_REGION[region].append(office)
+OFFICES_BY_REGION = dict(OFFICES_BY_REGION)
+OFFICE_INDEX = {r: {o: i for i, o in enumerate(lst)} for r, lst in OFFICES_BY_REGION.items()}
+ALL_OFFICES = list(NWS_OFFICES)
+ALL_OFFICE_INDEX = {o: i for i, o in enumerate(ALL_OFFICES)}
 
+# Office dropdown options (blank option first) for each region, and for no region selected
+OFFICE_OPTIONS_BY_REGION = {r: [""] + lst for r, lst in OFFICES_BY_REGION.items()}
+ALL_OFFICE_OPTIONS = [""] + ALL_OFFICES
 
+# Regional supplementals carry a region letter after the directive number (e.g. pd01003010e172004curr.pdf),
+# occasionally followed by "r" (e.g. pd01016001cr072003e_resc.pdf)
+REGIONAL_SUPPLEMENTAL_RE = re.compile(r"^pd\d+([{}])r?\d{{6}}".format("".join(SUPPLEMENTAL_REGION_CODES)))
 
+@lru_cache(maxsize=None)
+def classify_region(file_name):
+    """Return the NWS region a directive applies to, or "National" for national directives."""
+    match = REGIONAL_SUPPLEMENTAL_RE.match(file_name.lower())
+    return SUPPLEMENTAL_REGION_CODES[match.group(1)] if match else "National"
 
+# Directive file names start with "pd" and the three-digit series, e.g. pd01005001curr.pdf is series 010
+DIRECTIVE_SERIES_RE = re.compile(r"^pd(\d{3})")
 
+@lru_cache(maxsize=4096)
+def directive_url(file_name):
+    """Build the public weather.gov URL for a directive PDF."""
+    match = DIRECTIVE_SERIES_RE.match(file_name)
+    if not match:
+        return f"https://www.weather.gov/media/directives/{file_name}"
+    return f"https://www.weather.gov/media/directives/{match.group(1)}_pdfs/{file_name}"
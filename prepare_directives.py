@@ -1,6 +1,10 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Base URL of the public access link
 
@@ -8,11 +12,74 @@ from bs4 import BeautifulSoup
 output_dir = os.path.join(os.getcwd(), "directives")
 os.makedirs(output_dir, exist_ok=True)
 
+# Share one pooled session so downloads reuse keep-alive connections
+session = requests.Session()
+session.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=16,
+        pool_maxsize=32,
+        max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504]),
+    ),
+)
+
+def fetch_one(pdf_url):
+    """Download a single PDF into the output directory, returning False instead of raising if it fails."""
+    # Get the PDF filename
+    pdf_filename = os.path.join(output_dir, os.path.basename(pdf_url))
+    etag_filename = pdf_filename + ".etag"
+
+    try:
+        # Skip PDFs we already have: revalidate a stored ETag, else compare sizes
+        headers = {}
+        if os.path.exists(pdf_filename):
+            if os.path.exists(etag_filename):
+                with open(etag_filename) as etag_file:
+                    headers["If-None-Match"] = etag_file.read().strip()
+            else:
+                head_response = session.head(pdf_url, allow_redirects=True)
+                content_length = head_response.headers.get("Content-Length")
+                if content_length and int(content_length) == os.stat(pdf_filename).st_size:
+                    # Store the ETag so later runs can revalidate with a conditional GET instead
+                    etag = head_response.headers.get("ETag")
+                    if etag:
+                        with open(etag_filename, "w") as etag_file:
+                            etag_file.write(etag)
+                    print(f"Already downloaded: {pdf_filename}")
+                    return True
+
+        # Download and save the PDF, checking the content type on the GET itself
+        with session.get(pdf_url, stream=True, headers=headers) as pdf_response:
+            if pdf_response.status_code == 304:
+                print(f"Already downloaded: {pdf_filename}")
+                return True
+            # Dead links usually return an HTML error page, so skip them like any other non-PDF link
+            if pdf_response.headers.get("Content-Type") != "application/pdf":
+                print(f"Skipping non-PDF link: {pdf_url}")
+                return True
+            pdf_response.raise_for_status()
+
+            with open(pdf_filename, "wb") as pdf_file:
+                for chunk in pdf_response.iter_content(chunk_size=1 << 20):
+                    pdf_file.write(chunk)
+
+            # Remember the ETag so the next run can revalidate instead of re-downloading
+            etag = pdf_response.headers.get("ETag")
+            if etag:
+                with open(etag_filename, "w") as etag_file:
+                    etag_file.write(etag)
+    except (requests.RequestException, OSError) as e:
+        print(f"Failed to download {pdf_url}: {e}")
+        return False
+
+    print(f"Downloaded: {pdf_filename}")
+    return True
+
 def download_pdfs(series_str):
     base_url = f"https://www.weather.gov/directives/{series_str}"
     try:
         # Fetch the webpage
-        response = requests.get(base_url)
+        response = session.get(base_url)
         response.raise_for_status()  # Raise an exception for HTTP errors
 
         # Parse the webpage content
@@ -27,37 +94,27 @@ def download_pdfs(series_str):
 
         print(f"Found {len(pdf_links)} PDFs. Starting download...")
 
-        # Download each PDF
+        # Ensure each link is absolute
+        pdf_urls = []
         for link in pdf_links:
             pdf_url = link["href"]
-
-            # Ensure the link is absolute
             if not pdf_url.startswith("http"):
                 pdf_url = requests.compat.urljoin(base_url, pdf_url)
+            pdf_urls.append(pdf_url)
 
-            # Check if the URL actually points to a PDF
-            head_response = requests.head(pdf_url, allow_redirects=True)
-            if head_response.headers.get("Content-Type") != "application/pdf":
-                print(f"Skipping non-PDF link: {pdf_url}")
-                continue
-
-            # Get the PDF filename
-            pdf_filename = os.path.join(output_dir, os.path.basename(pdf_url))
-
-            # Download and save the PDF
-            with requests.get(pdf_url, stream=True) as pdf_response:
-                pdf_response.raise_for_status()
-                with open(pdf_filename, "wb") as pdf_file:
-                    for chunk in pdf_response.iter_content(chunk_size=1024):
-                        pdf_file.write(chunk)
-
-            print(f"Downloaded: {pdf_filename}")
+        # Download the PDFs concurrently
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(fetch_one, pdf_urls))
 
-        print("All PDFs have been downloaded successfully.")
+        failed = results.count(False)
+        if failed:
+            print(f"{failed} of {len(pdf_urls)} PDFs failed to download.")
+        else:
+            print("All PDFs have been downloaded successfully.")
     except Exception as e:
         print(f"An error occurred: {e}")
 
 if __name__ == "__main__":
   series_list = ["001", "010", "020", "030", "040", "050", "060", "070", "090", "100"]
-  for series_str in series_list:
-    download_pdfs(series_str)
\ No newline at end of file
+  with ThreadPoolExecutor(max_workers=4) as executor:
+    list(executor.map(download_pdfs, series_list))
@@ -0,0 +1,535 @@
+"""Directive indexing, retrieval and chat-engine setup shared by the Streamlit app."""
+import streamlit as st
+import os
+import re
+import asyncio
+import glob
+import json
+import logging
+import pickle
+import sqlite3
+import hashlib
+import threading
+import time
+from contextlib import closing
+from collections import Counter, OrderedDict, defaultdict
+from typing import Dict
+from urllib.parse import quote
+import faiss
+import httpx
+import tiktoken
+import numpy as np
+import openai
+from llama_index.llms.openai import OpenAI
+from llama_index.embeddings.openai import OpenAIEmbedding
+from llama_index.core import VectorStoreIndex, SimpleDirectoryReader, Settings, StorageContext, load_index_from_storage
+from llama_index.core.chat_engine import ContextChatEngine
+from llama_index.core.retrievers import BaseRetriever, QueryFusionRetriever
+from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.schema import MetadataMode, NodeWithScore
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.vector_stores import MetadataFilters, MetadataFilter, FilterOperator, VectorStoreQueryResult
+from llama_index.readers.file import PyMuPDFReader
+from llama_index.vector_stores.faiss import FaissVectorStore
+from nws_options import classify_region, directive_url
+
+logger = logging.getLogger(__name__)
+
+# ✅ Define directives path
+DIRECTIVES_PATH = "./directives"
+
+# ✅ Define index cache path
+INDEX_CACHE_PATH = "./directives_index"
+INDEX_VERSION = 12  # Bump when the index layout changes to force a rebuild
+PARSE_CACHE_PATH = "./directives_parsed"
+PDF_PARSER = "pymupdf"  # Part of each parse-cache key, so switching parsers re-parses every file
+
+def keyword_index_path(fingerprint):
+    """Return the FTS5 keyword table for one index build, so sessions on an older index keep their own."""
+    return os.path.join(INDEX_CACHE_PATH, f"keywords-{fingerprint}.sqlite")
+
+def directives_fingerprint():
+    """Hash the name, modification time and size of every directive PDF."""
+    digest = hashlib.sha256(f"v{INDEX_VERSION}|{EMBED_MODEL}\n".encode())
+    for root, _, files in sorted(os.walk(DIRECTIVES_PATH)):
+        for name in sorted(files):
+            if not name.lower().endswith(".pdf"):
+                continue
+            stat = os.stat(os.path.join(root, name))
+            digest.update(f"{os.path.join(root, name)}|{stat.st_mtime_ns}|{stat.st_size}\n".encode())
+    return digest.hexdigest()
+
+# ✅ Retrieval settings
+SIMILARITY_TOP_K = 3  # Also the number of cited sources
+
+# ✅ Embedding model (1536 dimensions)
+EMBED_MODEL = "text-embedding-3-small"
+
+# ✅ Chunking settings: larger sentence-aligned chunks mean fewer embeddings and vectors to search
+CHUNK_SIZE = 1536
+CHUNK_OVERLAP = 128
+MIN_PAGE_CHARS = 20  # Shorter pages are blank or page-number-only
+BLANK_PAGE_RE = re.compile(r"this page (is )?intentionally left blank", re.IGNORECASE)
+
+def is_blank_page(text):
+    """Return True for pages with too little text to index, or that are marked as intentionally blank."""
+    return len(text.strip()) < MIN_PAGE_CHARS or BLANK_PAGE_RE.search(text) is not None
+
+# ✅ HNSW graph settings: neighbours per node, build-time and query-time candidate list sizes
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 64
+HNSW_EF_SEARCH = 40
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire ``ttl`` seconds after they are stored."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] < time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+def normalize_prompt(prompt):
+    """Normalize a prompt for use as a cache key."""
+    return " ".join(prompt.lower().split())
+
+class CachedQueryEmbedding(OpenAIEmbedding):
+    """OpenAI embedding client that reuses the embeddings of recently asked queries."""
+
+    _query_cache: TTLCache = PrivateAttr(default_factory=lambda: TTLCache(max_size=1024, ttl=24 * 3600))
+
+    def _get_query_embedding(self, query):
+        key = normalize_prompt(query)
+        embedding = self._query_cache.get(key)
+        if embedding is None:
+            embedding = super()._get_query_embedding(query)
+            self._query_cache.set(key, embedding)
+        return embedding
+
+    async def _aget_query_embedding(self, query):
+        # Go through the cache and the shared sync client rather than an async client bound to one event loop
+        return await asyncio.to_thread(self._get_query_embedding, query)
+
+# ✅ Cache the tokenizer, HTTP connection pool and embedding client once per process
+@st.cache_resource(show_spinner=False)
+def get_http_client():
+    """Create the HTTP client whose keep-alive pool is shared by all OpenAI calls."""
+    return httpx.Client(timeout=httpx.Timeout(60.0, connect=10.0))
+
+@st.cache_resource(show_spinner=False)
+def get_encoder():
+    """Load the GPT-4o tiktoken encoder."""
+    return tiktoken.encoding_for_model("gpt-4o")
+
+@st.cache_resource(show_spinner=False)
+def get_embed_model():
+    """Create the OpenAI embedding client used for queries."""
+    # 128 chunks per request stays under OpenAI's 300k-token request limit even for large chunks
+    return CachedQueryEmbedding(
+        model=EMBED_MODEL, embed_batch_size=128, num_workers=8, http_client=get_http_client()
+    )
+
+def get_build_embed_model():
+    """Create an OpenAI embedding client for one index build.
+
+    Each build embeds inside its own ``asyncio.run`` event loop, so the async client must not be reused
+    across builds: its connection pool would stay bound to the first, closed loop.
+    """
+    return OpenAIEmbedding(
+        model=EMBED_MODEL, embed_batch_size=128, num_workers=8, reuse_client=False, http_client=get_http_client()
+    )
+
+# ✅ Ensure OpenAI API key exists; only the setup is cached, so a newly added key is picked up on the next rerun
+@st.cache_resource(show_spinner=False)
+def init_openai():
+    """Set the OpenAI API key from Streamlit secrets and the global LlamaIndex settings, once per process."""
+    openai.api_key = st.secrets["openai_key"]
+    Settings.tokenizer = get_encoder().encode
+    Settings.embed_model = get_embed_model()
+
+def configure_openai():
+    """Configure OpenAI from Streamlit secrets; return False if the key is missing."""
+    if "openai_key" not in st.secrets:
+        return False
+    init_openai()
+    return True
+
+class RegionFaissVectorStore(FaissVectorStore):
+    """FAISS vector store that applies ``region`` IN filters as an ID selector inside the HNSW search."""
+
+    _region_ids: Dict[str, np.ndarray] = PrivateAttr(default_factory=dict)
+
+    def set_regions(self, index):
+        """Record which FAISS ids belong to each region, using the index's docstore metadata."""
+        ids_by_region = defaultdict(list)
+        for faiss_id, node_id in index.index_struct.nodes_dict.items():
+            ids_by_region[index.docstore.get_node(node_id).metadata["region"]].append(int(faiss_id))
+        self._region_ids = {region: np.array(ids, dtype="int64") for region, ids in ids_by_region.items()}
+
+    def query(self, query, **kwargs):
+        if query.filters is None:
+            return super().query(query, **kwargs)
+
+        # ✅ Only search vectors from the requested regions instead of filtering results afterwards
+        regions = [region for metadata_filter in query.filters.filters for region in metadata_filter.value]
+        allowed_ids = np.concatenate([self._region_ids.get(region, np.empty(0, dtype="int64")) for region in regions])
+        selector = faiss.IDSelectorBatch(allowed_ids)
+        query_embedding = np.array([query.query_embedding], dtype="float32")
+        similarities, faiss_ids = self._faiss_index.search(
+            query_embedding, query.similarity_top_k,
+            params=faiss.SearchParametersHNSW(sel=selector, efSearch=max(HNSW_EF_SEARCH, query.similarity_top_k)),
+        )
+
+        hits = [(score, faiss_id) for score, faiss_id in zip(similarities[0], faiss_ids[0]) if faiss_id >= 0]
+        return VectorStoreQueryResult(
+            similarities=[float(score) for score, _ in hits], ids=[str(faiss_id) for _, faiss_id in hits]
+        )
+
+    async def aquery(self, query, **kwargs):
+        # FAISS releases the GIL while searching, so a worker thread lets other retrievers run meanwhile
+        return await asyncio.to_thread(self.query, query, **kwargs)
+
+def load_documents():
+    """Parse the directive PDFs, reusing the cached parse of every file that has not changed."""
+    os.makedirs(PARSE_CACHE_PATH, exist_ok=True)
+    docs_by_file = {}
+    stale_files = {}
+    # ✅ Key everything by the path under DIRECTIVES_PATH, so same-named PDFs in different folders stay separate
+    for root, _, files in sorted(os.walk(DIRECTIVES_PATH)):
+        for name in sorted(files):
+            if not name.lower().endswith(".pdf"):
+                continue
+            path = os.path.join(root, name)
+            rel_path = os.path.relpath(path, DIRECTIVES_PATH)
+            stat = os.stat(path)
+            file_key = (PDF_PARSER, stat.st_mtime_ns, stat.st_size)
+            cache_file = os.path.join(PARSE_CACHE_PATH, f"{quote(rel_path, safe='')}.pkl")
+            if os.path.exists(cache_file):
+                # A truncated or unreadable cache file is treated like a stale one and re-parsed
+                try:
+                    with open(cache_file, "rb") as f:
+                        cached_key, docs = pickle.load(f)
+                except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+                    cached_key = None
+                if cached_key == file_key:
+                    docs_by_file[rel_path] = docs
+                    continue
+            docs_by_file[rel_path] = None  # Hold the file's place so the output keeps file-name order
+            stale_files[rel_path] = (path, cache_file, file_key)
+
+    # ✅ Drop cached parses of PDFs that no longer exist, and temp files left by interrupted writes
+    cache_files = {f"{quote(rel_path, safe='')}.pkl" for rel_path in docs_by_file}
+    for cache_name in os.listdir(PARSE_CACHE_PATH):
+        if cache_name not in cache_files:
+            os.remove(os.path.join(PARSE_CACHE_PATH, cache_name))
+
+    # ✅ Only new or edited PDFs are parsed, in parallel across CPU cores with the C-backed PyMuPDF parser;
+    # a single stale file is parsed in-process rather than paying to start a worker pool
+    if stale_files:
+        reader = SimpleDirectoryReader(
+            input_files=[path for path, _, _ in stale_files.values()],
+            file_extractor={".pdf": PyMuPDFReader()},
+            filename_as_id=True,
+        )
+        parsed_docs = defaultdict(list)
+        num_workers = min(len(stale_files), os.cpu_count() or 1)
+        for doc in reader.load_data(num_workers=num_workers, show_progress=True):
+            parsed_docs[os.path.relpath(doc.metadata["file_path"], DIRECTIVES_PATH)].append(doc)
+        for rel_path, (_, cache_file, file_key) in stale_files.items():
+            docs_by_file[rel_path] = parsed_docs[rel_path]
+            if not parsed_docs[rel_path]:
+                continue  # Retry files that produced nothing on the next build instead of caching the failure
+            # ✅ Write beside the cache file and swap it in, so an interrupted write never leaves a truncated pickle
+            tmp_file = f"{cache_file}.tmp"
+            with open(tmp_file, "wb") as f:
+                pickle.dump((file_key, parsed_docs[rel_path]), f)
+            os.replace(tmp_file, cache_file)
+
+    # ✅ Return pages in file-name order whether or not they came from the cache
+    return [doc for docs in docs_by_file.values() for doc in docs]
+
+def drop_duplicate_pages(docs):
+    """Keep the first page with each text per region.
+
+    A regional supplemental that quotes a national page keeps both copies, so the national one stays
+    visible to every region.
+    """
+    seen_hashes = set()
+    unique_docs = []
+    for doc in docs:
+        content_hash = hashlib.sha256(f"{doc.metadata['region']}\n{doc.get_content()}".encode()).digest()
+        if content_hash not in seen_hashes:
+            seen_hashes.add(content_hash)
+            unique_docs.append(doc)
+    return unique_docs
+
+# ✅ Words and identifiers such as "10-1601" become quoted FTS5 terms
+KEYWORD_TERM_RE = re.compile(r"\w+(?:[-.]\w+)*")
+
+def keyword_terms(query):
+    """Return the identifier-like terms of a query, such as "10-1601" or "pd01016001", for exact matching.
+
+    Plain words are left to vector search, so questions like "what does the directive say" bring in no
+    BM25 matches on stopwords.
+    """
+    return [term for term in KEYWORD_TERM_RE.findall(query) if len(term) >= 3 and any(c.isdigit() for c in term)]
+
+def build_keyword_index(nodes, path):
+    """Write an SQLite FTS5 table of every chunk's text for keyword retrieval."""
+    os.makedirs(INDEX_CACHE_PATH, exist_ok=True)
+    # ✅ Build beside the target and swap it in, so readers never see a half-written table
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    with closing(sqlite3.connect(tmp_path)) as conn:
+        conn.execute("CREATE VIRTUAL TABLE chunks USING fts5(text, node_id UNINDEXED, region UNINDEXED)")
+        conn.executemany(
+            "INSERT INTO chunks (text, node_id, region) VALUES (?, ?, ?)",
+            [(node.get_content(), node.node_id, node.metadata["region"]) for node in nodes],
+        )
+        conn.commit()
+    os.replace(tmp_path, path)
+
+    # ✅ Keep this table and the previous one for sessions still on the older index; delete the rest
+    tables = sorted(glob.glob(os.path.join(INDEX_CACHE_PATH, "keywords-*.sqlite")), key=os.path.getmtime, reverse=True)
+    for old_path in tables[2:]:
+        if old_path != path:
+            os.remove(old_path)
+
+class KeywordRetriever(BaseRetriever):
+    """BM25 keyword retriever over the FTS5 chunk table, restricted to a set of regions."""
+
+    def __init__(self, docstore, path, regions, similarity_top_k):
+        super().__init__()
+        self._docstore = docstore
+        self._path = path
+        self._regions = regions
+        self._similarity_top_k = similarity_top_k
+
+    def _retrieve(self, query_bundle):
+        terms = keyword_terms(query_bundle.query_str)
+        if not terms:
+            return []
+
+        # ✅ FTS5's bm25() is lower-is-better, so negate it for a higher-is-better score
+        placeholders = ", ".join("?" for _ in self._regions)
+        # ✅ Open read-only so a pruned table is not recreated empty; sessions on a pruned index fall back to vectors only
+        try:
+            with closing(sqlite3.connect(f"file:{self._path}?mode=ro", uri=True)) as conn:
+                rows = conn.execute(
+                    f"SELECT node_id, bm25(chunks) FROM chunks WHERE chunks MATCH ? AND region IN ({placeholders}) "
+                    "ORDER BY bm25(chunks) LIMIT ?",
+                    [" OR ".join(f'"{term}"' for term in terms), *self._regions, self._similarity_top_k],
+                ).fetchall()
+        except sqlite3.OperationalError:
+            logger.warning("Keyword table %s is unavailable; using vector retrieval only", self._path)
+            return []
+        nodes = [(self._docstore.get_node(node_id, raise_error=False), score) for node_id, score in rows]
+        return [NodeWithScore(node=node, score=-score) for node, score in nodes if node is not None]
+
+    async def _aretrieve(self, query_bundle):
+        return await asyncio.to_thread(self._retrieve, query_bundle)
+
+# ✅ Load and cache directive data
+@st.cache_resource(show_spinner=False)
+def load_index(fingerprint):
+    """Load all directives into one index, tagging each with the region it applies to.
+
+    The index is persisted and reused until ``fingerprint`` changes.
+    """
+    # ✅ Reuse the persisted index if the directives have not changed
+    manifest_file = os.path.join(INDEX_CACHE_PATH, "manifest.json")
+    if os.path.exists(manifest_file) and os.path.exists(keyword_index_path(fingerprint)):
+        with open(manifest_file) as f:
+            if json.load(f).get("fingerprint") == fingerprint:
+                st.write("📦 Loaded directives index from disk cache.")
+                vector_store = RegionFaissVectorStore.from_persist_dir(INDEX_CACHE_PATH)
+                index = load_index_from_storage(
+                    StorageContext.from_defaults(vector_store=vector_store, persist_dir=INDEX_CACHE_PATH)
+                )
+                vector_store.set_regions(index)
+                return index
+
+    all_docs = load_documents()
+
+    # ✅ Drop blank and near-empty pages so they never become vectors
+    all_docs = [doc for doc in all_docs if not is_blank_page(doc.text)]
+
+    # ✅ Tag directives with their region so retrieval can filter at query time, and precompute source links
+    for doc in all_docs:
+        doc.metadata["region"] = classify_region(doc.metadata["file_name"])
+        doc.metadata["source_url"] = directive_url(doc.metadata["file_name"])
+        doc.excluded_embed_metadata_keys.extend(["region", "source_url"])
+        doc.excluded_llm_metadata_keys.extend(["region", "source_url"])
+
+    # ✅ Drop repeated pages so each is only embedded once
+    unique_docs = drop_duplicate_pages(all_docs)
+    duplicate_count = len(all_docs) - len(unique_docs)
+    all_docs = unique_docs
+    region_counts = Counter(doc.metadata["region"] for doc in all_docs)
+
+    # ✅ Checked after filtering, since PDFs without a text layer leave no pages to index
+    if not all_docs:
+        st.error("🚨 No directive documents found!")
+        st.stop()
+
+    # ✅ Debugging Information
+    total_docs = len(all_docs)
+    national_count = region_counts.pop("National", 0)
+
+    st.write(f"📊 **Debugging Info:**")
+    st.write(f"- Total directives loaded: **{total_docs}**")
+    st.write(f"- Duplicate pages dropped: **{duplicate_count}**")
+    st.write(f"- National directives: **{national_count}**")
+    for region, regional_count in sorted(region_counts.items()):
+        st.write(f"- Regional supplementals for `{region}`: **{regional_count}**")
+
+    # ✅ Split into nodes and embed large batches concurrently to cut OpenAI round trips
+    nodes = SentenceSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP).get_nodes_from_documents(all_docs)
+    nodes.sort(key=lambda node: len(node.text))  # Similar-length chunks per batch even out request sizes
+    embeddings = asyncio.run(get_build_embed_model().aget_text_embedding_batch(
+        [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes], show_progress=True
+    ))
+    for node, embedding in zip(nodes, embeddings):
+        node.embedding = embedding
+
+    # ✅ Store vectors in an int8-quantized HNSW graph instead of a brute-force float32 scan
+    vectors = np.array(embeddings, dtype="float32")
+    faiss_index = faiss.IndexHNSWSQ(vectors.shape[1], faiss.ScalarQuantizer.QT_8bit, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+    faiss_index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    faiss_index.hnsw.efSearch = HNSW_EF_SEARCH
+    faiss_index.train(vectors)
+    vector_store = RegionFaissVectorStore(faiss_index=faiss_index)
+    storage_context = StorageContext.from_defaults(vector_store=vector_store)
+
+    index = VectorStoreIndex(nodes, storage_context=storage_context, insert_batch_size=2048, show_progress=True)
+    vector_store.set_regions(index)
+    build_keyword_index(nodes, keyword_index_path(fingerprint))
+
+    # ✅ Persist the index and record which directives it was built from
+    index.storage_context.persist(persist_dir=INDEX_CACHE_PATH)
+    with open(manifest_file, "w") as f:
+        json.dump({"fingerprint": fingerprint, "index_version": INDEX_VERSION,
+                   "documents": total_docs, "nodes": len(nodes)}, f, indent=2)
+    return index
+
+# ✅ Share answers across sessions until the directives change
+@st.cache_resource(show_spinner=False)
+def get_response_cache(fingerprint):
+    """Return the response cache for the current directives index."""
+    return TTLCache(max_size=512, ttl=6 * 3600)
+
+@st.cache_resource(show_spinner=False)
+def get_retrieval_cache(fingerprint):
+    """Return the retrieval cache for the current directives index."""
+    return TTLCache(max_size=512, ttl=300)
+
+class CachedRetriever(BaseRetriever):
+    """Serve repeated queries for a region from a TTL cache before running the vector search."""
+
+    def __init__(self, retriever, cache, region):
+        super().__init__()
+        self._retriever = retriever
+        self._cache = cache
+        self._region = region
+
+    def _retrieve(self, query_bundle):
+        key = (self._region, hashlib.sha1(normalize_prompt(query_bundle.query_str).encode()).hexdigest())
+        nodes = self._cache.get(key)
+        if nodes is None:
+            nodes = self._retriever.retrieve(query_bundle)
+            self._cache.set(key, nodes)
+        # ✅ Report cache effectiveness to operators rather than in the UI
+        logger.info("Retrieval cache: %d hits / %d misses", self._cache.hits, self._cache.misses)
+        return nodes
+
+# ✅ System prompt, filled in with the user's region
+SYSTEM_PROMPT_TEMPLATE = """
+            You are an expert on the NOAA National Weather Service (NWS) Directives. Your role is to provide
+            accurate and detailed answers based strictly on official NWS and NOAA directives.
+
+            You understand the classification rules for regional supplementals as defined in the document 
+            'pd00101001curr.pdf'. Use these rules to determine which regional directives apply to {region}, in 
+            addition to always considering national directives.
+
+            Guidelines:
+            1. Assume all questions relate to NOAA or the National Weather Service.
+            2. Prioritize national directives over regional supplementals unless specifically asked.
+            3. When citing regional supplementals, ensure the national directive for that series and directive number is also included.
+            4. Use precise legal wording as written in the directives (e.g., "will," "shall," "may," "should").
+            5. Do not interpret or modify directive language beyond what is explicitly stated.
+            6. Always cite the most relevant directive in responses.
+            7. Stick strictly to documented facts; do not make assumptions. Do not hallucinate."""
+
+@st.cache_resource(show_spinner=False)
+def get_llm():
+    """Create the GPT-4o client shared by every region, on the process-wide HTTP connection pool."""
+    # ✅ Use GPT-4o for high-accuracy reasoning
+    return OpenAI(model="gpt-4o", temperature=0.2, http_client=get_http_client())
+
+@st.cache_resource(show_spinner=False)
+def get_retriever(_index, fingerprint, region):
+    """Build the region's retriever once, returning only national directives and the region's supplementals."""
+    # ✅ Restrict retrieval to national directives plus the selected region's supplementals
+    regions = sorted({"National", region})
+    filters = MetadataFilters(filters=[MetadataFilter(key="region", value=regions, operator=FilterOperator.IN)])
+
+    # ✅ Fuse vector search with keyword search so exact identifiers like "NWSI 10-1601" are found;
+    # both searches run concurrently, so retrieval takes as long as the slower one
+    hybrid_retriever = QueryFusionRetriever(
+        [
+            _index.as_retriever(similarity_top_k=SIMILARITY_TOP_K, filters=filters),
+            KeywordRetriever(_index.docstore, keyword_index_path(fingerprint), regions, SIMILARITY_TOP_K),
+        ],
+        llm=get_llm(),
+        mode="reciprocal_rerank",
+        similarity_top_k=SIMILARITY_TOP_K,
+        num_queries=1,
+        use_async=True,
+    )
+    return CachedRetriever(hybrid_retriever, get_retrieval_cache(fingerprint), region)
+
+def build_chat_engine(index, fingerprint, region):
+    """Wrap the region's cached retriever in a per-session chat engine.
+
+    Context mode retrieves with the latest message and answers in a single LLM call, with the chat
+    history in the prompt, instead of spending a separate call on condensing the question first.
+    """
+    return ContextChatEngine.from_defaults(
+        retriever=get_retriever(index, fingerprint, region),
+        llm=get_llm(),
+        system_prompt=SYSTEM_PROMPT_TEMPLATE.format(region=region),
+    )
+
+def format_citations(source_nodes):
+    """Format up to ``SIMILARITY_TOP_K`` distinct source links as a markdown list, or "" if there are none."""
+    sources = []
+    seen_sources = set()
+    for node in source_nodes[:SIMILARITY_TOP_K]:
+        source_url = node.metadata.get("source_url")
+        if source_url and source_url not in seen_sources:
+            sources.append(f"- {node.metadata['file_name']} ([View]({source_url}))")
+            seen_sources.add(source_url)
+    return "\n\n**Sources:**\n" + "\n".join(sources) if sources else ""
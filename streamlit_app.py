@@ -1,9 +1,14 @@
 import streamlit as st
 import os
-import openai
-from llama_index.llms.openai import OpenAI
-from llama_index.core import VectorStoreIndex, SimpleDirectoryReader, Settings
-from nws_options import NWS_OFFICES, NWS_REGIONS  # Import from your NWS options file
+from llama_index.core.llms import ChatMessage
+from nws_options import (  # Import from your NWS options file
+    NWS_OFFICES, REGION_OPTIONS, REGION_TO_IDX,
+    OFFICE_OPTIONS_BY_REGION, OFFICE_INDEX, ALL_OFFICE_OPTIONS, ALL_OFFICE_INDEX,
+)
+from rag_core import (
+    DIRECTIVES_PATH, configure_openai, directives_fingerprint, load_index, build_chat_engine, format_citations,
+    get_response_cache, normalize_prompt,
+)
 
 # ✅ Set Streamlit page configuration
 st.set_page_config(
@@ -24,6 +29,8 @@ if "messages" not in st.session_state:
     ]
 if "chat_engine" not in st.session_state:
     st.session_state.chat_engine = None
+if "chat_engine_region" not in st.session_state:
+    st.session_state.chat_engine_region = None
 
 st.title("Welcome to the NWS Directives Chatbot")
 st.write("Before we begin, please select your **NWS Office** or **Region**.")
@@ -31,18 +38,19 @@ st.write("Before we begin, please select your **NWS Office** or **Region**.")
 # ✅ Dropdown to select region
 selected_region = st.selectbox(
     "Select your NWS Region:",
-    [""] + list(NWS_REGIONS.values()),  
-    index=0 if not st.session_state.user_region else list(NWS_REGIONS.values()).index(st.session_state.user_region) + 1,
+    REGION_OPTIONS,
+    index=REGION_TO_IDX.get(st.session_state.user_region, 0),
 )
 
 # ✅ Filter offices based on selected region
-filtered_offices = [office for office, region in NWS_OFFICES.items() if region == selected_region] if selected_region else list(NWS_OFFICES.keys())
+office_options = OFFICE_OPTIONS_BY_REGION.get(selected_region, ALL_OFFICE_OPTIONS)
+office_index = OFFICE_INDEX.get(selected_region, ALL_OFFICE_INDEX)
 
 # ✅ Dropdown to select office
 selected_office = st.selectbox(
     "Select your NWS Office:",
-    [""] + filtered_offices,  
-    index=0 if not st.session_state.user_office else filtered_offices.index(st.session_state.user_office) + 1 if st.session_state.user_office in filtered_offices else 0,
+    office_options,
+    index=office_index.get(st.session_state.user_office, -1) + 1,
 )
 
 # ✅ Update session state dynamically
@@ -61,113 +69,67 @@ if st.session_state.user_region:
     st.write(f"✅ Selected Region: **{st.session_state.user_region}**")
 
 # ✅ Ensure OpenAI API key exists
-if "openai_key" not in st.secrets:
+if not configure_openai():
     st.error("⚠️ Missing OpenAI API key! Add it to Streamlit secrets.")
     st.stop()
-else:
-    openai.api_key = st.secrets["openai_key"]
 
 # ✅ Prevent chat from loading until an office or region is selected
 if not st.session_state.user_office and not st.session_state.user_region:
     st.warning("🚨 Please select your NWS Office or Region to continue.")
     st.stop()
 
-# ✅ Define directives path
-DIRECTIVES_PATH = "./directives"
-if not os.path.exists(DIRECTIVES_PATH):
-    st.error(f"🚨 Error: The `{DIRECTIVES_PATH}` folder is missing!")
-    st.stop()
-
-# ✅ Load and cache directive data
-@st.cache_resource(show_spinner=False)
-def load_directives(region):
-    """Load directives while filtering for national and relevant regional directives."""
-    reader = SimpleDirectoryReader(input_dir=DIRECTIVES_PATH, recursive=True)
-    all_docs = reader.load_data()
-
-    if not all_docs:
-        st.error("🚨 No directive documents found!")
+# ✅ Load the shared directives index once per session; the folder check and fingerprinting stat the disk, so skip them on reruns
+if st.session_state.get("index") is None:
+    if not os.path.exists(DIRECTIVES_PATH):
+        st.error(f"🚨 Error: The `{DIRECTIVES_PATH}` folder is missing!")
         st.stop()
+    st.session_state.fingerprint = directives_fingerprint()
+    st.session_state.index = load_index(st.session_state.fingerprint)
+fingerprint = st.session_state.fingerprint
+index = st.session_state.index
 
-    # ✅ Filter directives
-    national_directives = [doc for doc in all_docs if "pd" in doc.metadata["file_name"]]
-    regional_directives = [doc for doc in all_docs if region.lower() in doc.metadata["file_name"].lower()]
-
-    # ✅ Debugging Information
-    total_docs = len(all_docs)
-    national_count = len(national_directives)
-    regional_count = len(regional_directives)
-
-    st.write(f"📊 **Debugging Info:**")
-    st.write(f"- Total directives loaded: **{total_docs}**")
-    st.write(f"- National directives: **{national_count}**")
-    st.write(f"- Regional supplementals for `{region}`: **{regional_count}**")
-
-    # ✅ Combine documents for indexing
-    filtered_docs = national_directives + regional_directives
-
-    # ✅ Use GPT-4o for high-accuracy reasoning
-    Settings.llm = OpenAI(
-        model="gpt-4o",
-        temperature=0.2,
-        system_prompt=f"""
-            You are an expert on the NOAA National Weather Service (NWS) Directives. Your role is to provide
-            accurate and detailed answers based strictly on official NWS and NOAA directives.
-
-            You understand the classification rules for regional supplementals as defined in the document 
-            'pd00101001curr.pdf'. Use these rules to determine which regional directives apply to {st.session_state.user_region}, in 
-            addition to always considering national directives.
-
-            Guidelines:
-            1. Assume all questions relate to NOAA or the National Weather Service.
-            2. Prioritize national directives over regional supplementals unless specifically asked.
-            3. When citing regional supplementals, ensure the national directive for that series and directive number is also included.
-            4. Use precise legal wording as written in the directives (e.g., "will," "shall," "may," "should").
-            5. Do not interpret or modify directive language beyond what is explicitly stated.
-            6. Always cite the most relevant directive in responses.
-            7. Stick strictly to documented facts; do not make assumptions. Do not hallucinate.""",
-    )
-
-    index = VectorStoreIndex.from_documents(filtered_docs)
-    return index
-
-# ✅ Load directives based on user selection
-index = load_directives(st.session_state.user_region)
-
-# ✅ Initialize chat engine
-if st.session_state.chat_engine is None:
-    st.session_state.chat_engine = index.as_chat_engine(
-        chat_mode="condense_question", verbose=True, streaming=True, return_source_nodes=True
-    )
+# ✅ Rebuild the chat engine only when the region changes
+if st.session_state.chat_engine is None or st.session_state.chat_engine_region != st.session_state.user_region:
+    st.session_state.chat_engine = build_chat_engine(index, fingerprint, st.session_state.user_region)
+    st.session_state.chat_engine_region = st.session_state.user_region
 
 # ✅ Get user input
 if prompt := st.chat_input("Ask a question"):
     st.session_state.messages.append({"role": "user", "content": prompt})
 
-# ✅ Display chat history
-for message in st.session_state.messages:
+# ✅ Display chat history, collapsing older turns into one markdown block so long chats render fewer elements
+recent_messages = st.session_state.messages
+if len(recent_messages) > 6:
+    st.markdown("\n\n".join(f"**{m['role'].title()}:** {m['content']}" for m in recent_messages[:-4]))
+    recent_messages = recent_messages[-4:]
+for message in recent_messages:
     with st.chat_message(message["role"]):
         st.write(message["content"])
 
 # ✅ Generate response if last message is from user
 if st.session_state.messages[-1]["role"] != "assistant":
     with st.chat_message("assistant"):
-        response_stream = st.session_state.chat_engine.stream_chat(prompt)
-        response_text = "".join(response_stream.response_gen) 
-
-        # ✅ Extract sources
-        sources = []
-        seen_sources = set()
-        for node in response_stream.source_nodes[:3]:  
-            if "file_name" in node.metadata:
-                file_name = os.path.basename(node.metadata["file_name"])
-                source_url = f"https://www.weather.gov/media/directives/{file_name}"
-                if source_url not in seen_sources:
-                    sources.append(f"- {file_name} ([View]({source_url}))")
-                    seen_sources.add(source_url)
-
-        if sources:
-            response_text += "\n\n**Sources:**\n" + "\n".join(sources)
-
-        st.write(response_text)
+        # ✅ Reuse the answer if this conversation has already been asked in the same region/office
+        response_cache = get_response_cache(fingerprint)
+        user_prompts = tuple(normalize_prompt(m["content"]) for m in st.session_state.messages if m["role"] == "user")
+        cache_key = (st.session_state.user_region, st.session_state.user_office, user_prompts)
+        response_text = response_cache.get(cache_key)
+
+        if response_text is not None:
+            st.write(response_text)
+        else:
+            # ✅ Pass the visible history so the engine's memory stays in sync with cached turns
+            chat_history = [ChatMessage(role=m["role"], content=m["content"]) for m in st.session_state.messages[1:-1]]
+            response_stream = st.session_state.chat_engine.stream_chat(prompt, chat_history=chat_history)
+            # ✅ Render tokens as they arrive; write_stream returns the full text
+            response_text = st.write_stream(response_stream.response_gen)
+
+            # ✅ Extract sources
+            sources_text = format_citations(response_stream.source_nodes)
+            if sources_text:
+                st.write(sources_text)
+                response_text += sources_text
+
+            response_cache.set(cache_key, response_text)
+
         st.session_state.messages.append({"role": "assistant", "content": response_text})
\ No newline at end of file
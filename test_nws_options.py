@@ -0,0 +1,35 @@
+import pytest
+
+from nws_options import classify_region, directive_url
+
+
+@pytest.mark.parametrize(
+    "file_name, region",
+    [
+        ("pd00101001curr.pdf", "National"),
+        ("pd00101curr.pdf", "National"),
+        ("pd00102003a_cert11.pdf", "National"),
+        ("pd00101001a052003a_resc.pdf", "Alaska Region"),
+        ("pd00101001c042003d_resc.pdf", "Central Region"),
+        ("pd01016001cr072003e_resc.pdf", "Central Region"),
+        ("pd00101001e122004curr.pdf", "Eastern Region"),
+        ("PD00101001E122004CURR.PDF", "Eastern Region"),
+        ("pd01003010p172004curr.pdf", "Pacific Region"),
+        ("pd01003010s172004curr.pdf", "Southern Region"),
+        ("pd01003010w172004curr.pdf", "Western Region"),
+    ],
+)
+def test_classify_region(file_name, region):
+    assert classify_region(file_name) == region
+
+
+@pytest.mark.parametrize(
+    "file_name, url",
+    [
+        ("pd01005001curr.pdf", "https://www.weather.gov/media/directives/010_pdfs/pd01005001curr.pdf"),
+        ("pd00101001a052003a_resc.pdf", "https://www.weather.gov/media/directives/001_pdfs/pd00101001a052003a_resc.pdf"),
+        ("notice.pdf", "https://www.weather.gov/media/directives/notice.pdf"),
+    ],
+)
+def test_directive_url(file_name, url):
+    assert directive_url(file_name) == url
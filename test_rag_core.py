@@ -0,0 +1,159 @@
+import os
+import pickle
+
+import pymupdf
+import pytest
+from llama_index.core.schema import Document, TextNode
+
+import rag_core
+from rag_core import (
+    KeywordRetriever, TTLCache, build_keyword_index, drop_duplicate_pages, is_blank_page, keyword_index_path,
+    load_documents,
+)
+
+
+class StubDocstore:
+    """Serve nodes by id, like the index docstore the keyword retriever reads from."""
+
+    def __init__(self, nodes):
+        self._nodes = {node.node_id: node for node in nodes}
+
+    def get_node(self, node_id, raise_error=True):
+        if node_id not in self._nodes and raise_error:
+            raise ValueError(f"doc_id {node_id} not found.")
+        return self._nodes.get(node_id)
+
+
+KEYWORD_NODES = [
+    TextNode(id_="national", text="NWSI 10-1601 describes verification procedures.", metadata={"region": "National"}),
+    TextNode(id_="alaska", text="Alaska supplement to NWSI 10-1601.", metadata={"region": "Alaska Region"}),
+    TextNode(id_="scattered", text="Table 1601 lists the 10 products to verify.", metadata={"region": "National"}),
+    TextNode(id_="prose", text="What does the directive say about the office?", metadata={"region": "National"}),
+]
+
+
+@pytest.fixture
+def keyword_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(rag_core, "INDEX_CACHE_PATH", str(tmp_path))
+    path = keyword_index_path("test")
+    build_keyword_index(KEYWORD_NODES, path)
+    return path
+
+
+def retrieved_ids(path, regions, query, nodes=KEYWORD_NODES):
+    retriever = KeywordRetriever(StubDocstore(nodes), path, regions, similarity_top_k=3)
+    return {result.node.node_id for result in retriever.retrieve(query)}
+
+
+def test_keyword_retriever_matches_identifiers_as_phrases(keyword_path):
+    assert retrieved_ids(keyword_path, ["National"], "What does NWSI 10-1601 require?") == {"national"}
+
+
+def test_keyword_retriever_is_scoped_to_regions(keyword_path):
+    assert retrieved_ids(keyword_path, ["Alaska Region", "National"], "10-1601") == {"national", "alaska"}
+    assert retrieved_ids(keyword_path, ["Alaska Region"], "10-1601") == {"alaska"}
+
+
+def test_keyword_retriever_ignores_stopword_questions(keyword_path):
+    assert retrieved_ids(keyword_path, ["National"], "What does the directive say about the office?") == set()
+
+
+def test_keyword_retriever_skips_nodes_missing_from_docstore(keyword_path):
+    assert retrieved_ids(keyword_path, ["National"], "10-1601", nodes=KEYWORD_NODES[1:]) == set()
+
+
+def test_keyword_retriever_without_table_returns_nothing(tmp_path):
+    assert retrieved_ids(str(tmp_path / "keywords-gone.sqlite"), ["National"], "10-1601") == set()
+    assert not os.path.exists(tmp_path / "keywords-gone.sqlite")
+
+
+def test_build_keyword_index_keeps_current_and_previous_tables(tmp_path, monkeypatch):
+    monkeypatch.setattr(rag_core, "INDEX_CACHE_PATH", str(tmp_path))
+    for mtime, fingerprint in enumerate(["old", "previous", "current"]):
+        build_keyword_index(KEYWORD_NODES, keyword_index_path(fingerprint))
+        os.utime(keyword_index_path(fingerprint), (mtime, mtime))
+    build_keyword_index(KEYWORD_NODES, keyword_index_path("current"))
+    assert sorted(os.listdir(tmp_path)) == ["keywords-current.sqlite", "keywords-previous.sqlite"]
+
+
+@pytest.mark.parametrize(
+    "text, blank",
+    [
+        ("", True),
+        ("   \n 12 \n", True),
+        ("This page intentionally left blank", True),
+        ("THIS PAGE INTENTIONALLY LEFT BLANK\n\nNWSI 10-1601 JUNE 2024", True),
+        ("This Page Is Intentionally Left Blank.", True),
+        ("1. Purpose. This directive describes verification procedures.", False),
+    ],
+)
+def test_is_blank_page(text, blank):
+    assert is_blank_page(text) is blank
+
+
+def test_drop_duplicate_pages_is_per_region():
+    docs = [
+        Document(text="Shared page", metadata={"file_name": "pd00101001a052003a_resc.pdf", "region": "Alaska Region"}),
+        Document(text="Shared page", metadata={"file_name": "pd00101001curr.pdf", "region": "National"}),
+        Document(text="Shared page", metadata={"file_name": "pd00102001curr.pdf", "region": "National"}),
+    ]
+    assert drop_duplicate_pages(docs) == docs[:2]
+
+
+def test_ttl_cache_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rag_core.time, "monotonic", lambda: now[0])
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.set("key", "value")
+    now[0] += 59
+    assert cache.get("key") == "value"
+    now[0] += 2
+    assert cache.get("key") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+
+def write_pdf(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with pymupdf.open() as pdf:
+        pdf.new_page().insert_text((72, 72), text)
+        pdf.save(path)
+
+
+@pytest.fixture
+def directives_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(rag_core, "DIRECTIVES_PATH", str(tmp_path / "directives"))
+    monkeypatch.setattr(rag_core, "PARSE_CACHE_PATH", str(tmp_path / "parsed"))
+    return tmp_path
+
+
+def test_load_documents_reparses_corrupt_cache(directives_dir):
+    write_pdf(directives_dir / "directives" / "pd01016001curr.pdf", "NWSI 10-1601 verification")
+    assert [doc.text.strip() for doc in load_documents()] == ["NWSI 10-1601 verification"]
+
+    cache_file = directives_dir / "parsed" / "pd01016001curr.pdf.pkl"
+    cache_file.write_bytes(cache_file.read_bytes()[:10])
+    assert [doc.text.strip() for doc in load_documents()] == ["NWSI 10-1601 verification"]
+    _, docs = pickle.loads(cache_file.read_bytes())
+    assert [doc.text.strip() for doc in docs] == ["NWSI 10-1601 verification"]
+
+
+def test_load_documents_keys_cache_by_relative_path(directives_dir):
+    write_pdf(directives_dir / "directives" / "pd01016001curr.pdf", "Top-level copy")
+    write_pdf(directives_dir / "directives" / "archive" / "pd01016001curr.pdf", "Archived copy")
+    (directives_dir / "parsed").mkdir()
+    (directives_dir / "parsed" / "pd00101001curr.pdf.pkl").write_bytes(b"deleted directive")
+
+    assert sorted(doc.text.strip() for doc in load_documents()) == ["Archived copy", "Top-level copy"]
+    assert sorted(os.listdir(directives_dir / "parsed")) == [
+        "archive%2Fpd01016001curr.pdf.pkl", "pd01016001curr.pdf.pkl",
+    ]